@@ -1,16 +1,21 @@
 import discord
-from discord.ext import commands, tasks
+from discord.ext import commands
 import os
 from dotenv import load_dotenv
-import json
 import asyncio
+import time
 import hmac
+import binascii
 import hashlib
 import logging
-from datetime import datetime
-from queue import Queue
-import threading
-from flask import Flask, request, jsonify
+import atexit
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+from datetime import datetime, timezone
+import aiohttp
+from aiohttp import web
+from aiolimiter import AsyncLimiter
+import orjson
 
 # ===================== CONFIGURAÇÃO =====================
 load_dotenv()
@@ -21,260 +26,441 @@ GITHUB_SECRET = os.getenv('GITHUB_WEBHOOK_SECRET', '')
 CHANNEL_ID = int(os.getenv('DISCORD_CHANNEL_ID', 0))
 REPO_OWNER = os.getenv('GITHUB_REPO_OWNER', 'seu_usuario')
 REPO_NAME = os.getenv('GITHUB_REPO_NAME', 'seu_repositorio')
+TRACK_BRANCHES = frozenset(
+    branch.strip()
+    for branch in os.getenv('TRACK_BRANCHES', 'main').split(',')
+    if branch.strip()
+)
 
 # Configuração de logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler('github_bot.log', encoding='utf-8')
-    ]
-)
+# A escrita em console/arquivo fica numa thread própria, fora do event loop
+log_queue = SimpleQueue()
+log_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+log_handlers = [
+    logging.StreamHandler(),
+    logging.FileHandler('github_bot.log', encoding='utf-8')
+]
+for log_handler in log_handlers:
+    log_handler.setFormatter(log_formatter)
+
+log_listener = QueueListener(log_queue, *log_handlers)
+log_listener.start()
+atexit.register(log_listener.stop)
+
+root_logger = logging.getLogger()
+root_logger.setLevel(logging.INFO)
+root_logger.addHandler(QueueHandler(log_queue))
 logger = logging.getLogger(__name__)
 
-# Fila para comunicação entre threads
-push_queue = Queue()
+# Fila de pushes entre o servidor de webhooks e o envio ao Discord
+push_queue = asyncio.Queue()
 
 # ===================== DISCORD BOT =====================
 intents = discord.Intents.default()
 intents.message_content = True
 bot = commands.Bot(command_prefix='!', intents=intents)
+bot.target_channel = None  # Resolvido no on_ready ou no primeiro uso
+
+def get_target_channel():
+    """Retorna o canal alvo, buscando-o de novo enquanto não for encontrado"""
+    if bot.target_channel is None:
+        # O servidor pode ficar disponível depois do on_ready
+        bot.target_channel = bot.get_channel(CHANNEL_ID)
+    return bot.target_channel
 
-# ===================== FLASK APP =====================
-flask_app = Flask(__name__)
+# ===================== SERVIDOR WEBHOOK =====================
+webhook_runner = None
+webhook_active = False  # True só depois que a porta foi aberta
+push_worker = None
 
 def verify_signature(payload_body, secret_token, signature_header):
     """Verifica a assinatura do webhook do GitHub"""
-    if not secret_token or not signature_header:
+    if not secret_token:
         return True  # Permite se não houver segredo configurado
     
-    hash_object = hmac.new(
+    if not signature_header or not signature_header.startswith('sha256='):
+        return False
+    
+    # Compara os bytes do digest, sem montar a string hexadecimal esperada
+    try:
+        received_digest = binascii.unhexlify(signature_header[7:])
+    except (binascii.Error, ValueError):
+        return False
+    
+    expected_digest = hmac.new(
         secret_token.encode('utf-8'),
         msg=payload_body,
         digestmod=hashlib.sha256
-    )
-    expected_signature = "sha256=" + hash_object.hexdigest()
+    ).digest()
     
-    return hmac.compare_digest(expected_signature, signature_header)
+    return hmac.compare_digest(expected_digest, received_digest)
 
-@flask_app.route('/github-webhook', methods=['GET', 'POST'])
-def github_webhook():
+def parse_json(body):
+    """Decodifica o corpo da requisição, retornando None se inválido"""
+    try:
+        return orjson.loads(body)
+    except orjson.JSONDecodeError:
+        return None
+
+def json_response(payload, status=200):
+    """Resposta JSON serializada com orjson"""
+    return web.Response(
+        body=orjson.dumps(payload),
+        status=status,
+        content_type='application/json'
+    )
+
+async def github_webhook(request):
     """Endpoint principal para webhooks do GitHub"""
     
     if request.method == 'GET':
         # Para testes manuais
-        return jsonify({
+        return json_response({
             'status': 'active',
             'service': 'github-webhook-receiver',
             'timestamp': datetime.now().isoformat()
-        }), 200
+        }, status=200)
     
     # Método POST (webhook real)
     try:
         event_type = request.headers.get('X-GitHub-Event')
         delivery_id = request.headers.get('X-GitHub-Delivery')
         
-        logger.info(f"📨 Webhook recebido: {event_type} (ID: {delivery_id})")
+        logger.info("📨 Webhook recebido: %s (ID: %s)", event_type, delivery_id)
+        
+        body = await request.read()
         
         # Verificação de assinatura
         signature = request.headers.get('X-Hub-Signature-256')
-        if not verify_signature(request.data, GITHUB_SECRET, signature):
+        if not verify_signature(body, GITHUB_SECRET, signature):
             logger.warning("⚠️ Assinatura inválida do webhook")
-            return jsonify({'error': 'Invalid signature'}), 401
+            return json_response({'error': 'Invalid signature'}, status=401)
         
         # Processa baseado no tipo de evento
         if event_type == 'ping':
-            data = request.get_json(silent=True) or {}
+            data = parse_json(body) or {}
             zen_message = data.get('zen', 'No zen message')
             
-            logger.info(f"✅ PING recebido: {zen_message}")
+            logger.info("✅ PING recebido: %s", zen_message)
             
-            return jsonify({
+            return json_response({
                 'status': 'pong',
                 'zen': zen_message,
                 'event': 'ping',
                 'timestamp': datetime.now().isoformat()
-            }), 200
+            }, status=200)
         
         elif event_type == 'push':
-            data = request.get_json(silent=True)
+            data = parse_json(body)
             if not data:
                 logger.error("❌ Nenhum JSON recebido")
-                return jsonify({'error': 'No JSON data'}), 400
+                return json_response({'error': 'No JSON data'}, status=400)
             
             ref = data.get('ref', 'unknown')
             repo = data.get('repository', {}).get('full_name', 'unknown')
             
-            logger.info(f"📦 Push em {repo} - Branch: {ref}")
+            # Ignora branches não monitoradas antes de qualquer processamento
+            branch = ref.removeprefix('refs/heads/')
+            if branch not in TRACK_BRANCHES:
+                logger.info("ℹ️ Push ignorado em %s - Branch: %s", repo, ref)
+                return json_response({'status': 'ignored', 'branch': ref}, status=200)
             
-            # Adiciona à fila independente da branch
-            push_queue.put({
+            logger.info("📦 Push em %s - Branch: %s", repo, ref)
+            
+            # Adiciona à fila apenas pushes das branches monitoradas
+            push_queue.put_nowait({
                 'event': 'push',
                 'data': data,
-                'received_at': datetime.now().isoformat()
+                'delivery_id': delivery_id,
+                'received_ns': time.monotonic_ns()
             })
             
-            return jsonify({
-                'status': 'received',
-                'event': 'push',
-                'repository': repo,
-                'branch': ref.split('/')[-1],
-                'queued': True
-            }), 200
+            # Responde na hora; o envio ao Discord fica com process_pushes
+            headers = {'X-Request-Id': delivery_id} if delivery_id else None
+            return web.Response(status=202, headers=headers)
         
         else:
-            logger.info(f"ℹ️ Evento ignorado: {event_type}")
-            return jsonify({'status': 'ignored', 'event': event_type}), 200
+            logger.info("ℹ️ Evento ignorado: %s", event_type)
+            return json_response({'status': 'ignored', 'event': event_type}, status=200)
             
     except Exception as e:
-        logger.error(f"❌ Erro no webhook: {e}", exc_info=True)
-        return jsonify({'error': str(e)}), 500
+        logger.error("❌ Erro no webhook: %s", e, exc_info=True)
+        return json_response({'error': str(e)}, status=500)
 
-@flask_app.route('/health', methods=['GET'])
-def health():
+async def health(request):
     """Endpoint de saúde"""
-    return jsonify({
+    return json_response({
         'status': 'healthy',
         'timestamp': datetime.now().isoformat(),
         'queue_size': push_queue.qsize()
-    }), 200
-
-def run_flask():
-    """Executa o servidor Flask em thread separada"""
-    logger.info("🚀 Iniciando servidor Flask (porta 5000)")
-    
-    # Desativa logs verbose do Flask
-    flask_log = logging.getLogger('werkzeug')
-    flask_log.setLevel(logging.WARNING)
-    
-    flask_app.run(
-        host='0.0.0.0',
-        port=5000,
-        debug=False,
-        use_reloader=False,
-        threaded=True
-    )
+    }, status=200)
+
+webhook_app = web.Application()
+webhook_app.router.add_get('/github-webhook', github_webhook)
+webhook_app.router.add_post('/github-webhook', github_webhook)
+webhook_app.router.add_get('/health', health)
+
+async def start_webhook_server():
+    """Inicia o servidor de webhooks no event loop do bot"""
+    global webhook_runner, webhook_active
+    if webhook_runner is not None:
+        return  # on_ready pode disparar mais de uma vez
+    
+    logger.info("🚀 Iniciando servidor de webhooks (porta 5000)")
+    
+    # Sem log de acesso: evita formatar uma linha por requisição
+    runner = web.AppRunner(webhook_app, access_log=None)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, '0.0.0.0', 5000).start()
+    except OSError:
+        # Libera o runner para que o próximo on_ready tente de novo
+        await runner.cleanup()
+        raise
+    
+    webhook_runner = runner
+    webhook_active = True
+    logger.info("✅ Servidor de webhooks ativo")
+
+async def stop_webhook_server():
+    """Encerra o servidor de webhooks, se estiver ativo"""
+    global webhook_runner, webhook_active
+    if webhook_runner is None:
+        return
+    
+    webhook_active = False
+    await webhook_runner.cleanup()
+    webhook_runner = None
 
 # ===================== PROCESSAMENTO DE PUSHES =====================
+BATCH_WINDOW = 0.5  # Segundos para agrupar pushes em rajada
+MAX_EMBEDS_PER_MESSAGE = 10  # Limites do Discord por mensagem
+MAX_EMBED_CHARS_PER_MESSAGE = 6000
+MAX_SEND_ATTEMPTS = 3
+COLOR_PUSH = discord.Color.green()
+MAX_COMMITS_LISTED = 10
+COMMITS_FIELD_BUDGET = 1000  # Campo aceita 1024, com folga para a linha de excedentes
+MARKDOWN_TRANSLATION = str.maketrans({'`': "'", '*': None})
+
+# Rate limit do canal no Discord: 5 mensagens a cada 5 segundos
+channel_limiter = AsyncLimiter(5, 5)
+send_semaphore = asyncio.Semaphore(1)
+
 async def process_pushes():
     """Processa pushes da fila e envia para o Discord"""
     await bot.wait_until_ready()
     
     logger.info("🔄 Iniciando processamento de pushes...")
     
-    while not bot.is_closed():
+    while True:
+        # Aguarda sem polling até chegar um novo item
+        items = [await push_queue.get()]
+        
+        # Agrupa os pushes que chegarem dentro da janela
+        await asyncio.sleep(BATCH_WINDOW)
+        while not push_queue.empty():
+            items.append(push_queue.get_nowait())
+        
+        # IDs de entrega do GitHub (X-Request-Id) para correlacionar os logs
+        delivery_ids = [item['delivery_id'] for item in items if item.get('delivery_id')]
+        
         try:
-            # Processa todos os pushes na fila
-            while not push_queue.empty():
-                item = push_queue.get()
-                
-                if item['event'] == 'push':
-                    await process_github_push(item['data'])
-                
-                push_queue.task_done()
-                await asyncio.sleep(0.1)  # Pequena pausa entre processamentos
-            
-            await asyncio.sleep(1)  # Verifica a fila a cada segundo
-            
+            pushes = [item['data'] for item in items if item['event'] == 'push']
+            if pushes:
+                await process_github_push_batch(group_pushes(pushes), delivery_ids)
         except Exception as e:
-            logger.error(f"❌ Erro no processamento: {e}", exc_info=True)
-            await asyncio.sleep(5)
+            logger.error("❌ Erro no processamento %s: %s", delivery_ids, e, exc_info=True)
+        finally:
+            for _ in items:
+                push_queue.task_done()
 
-async def process_github_push(data):
-    """Processa dados do push e envia para o Discord"""
-    try:
-        channel = bot.get_channel(CHANNEL_ID)
-        if not channel:
-            logger.error(f"❌ Canal {CHANNEL_ID} não encontrado")
-            return
+def group_pushes(pushes):
+    """Junta os commits de pushes no mesmo repositório e branch"""
+    groups = {}
+    for data in pushes:
+        key = (data.get('repository', {}).get('full_name'), data.get('ref'))
+        previous = groups.get(key)
+        if previous is None:
+            groups[key] = data
+        else:
+            # Mantém os dados do push mais recente com todos os commits,
+            # comparando do início do primeiro push ao fim do último
+            merged = dict(
+                data,
+                commits=previous.get('commits', []) + data.get('commits', []),
+                before=previous.get('before')
+            )
+            merged.pop('compare', None)
+            compare = build_compare_url(merged)
+            if compare:
+                merged['compare'] = compare
+            groups[key] = merged
+    return list(groups.values())
+
+def build_compare_url(data):
+    """Monta a URL de comparação entre 'before' e 'after', se possível"""
+    html_url = data.get('repository', {}).get('html_url')
+    before = data.get('before') or ''
+    after = data.get('after') or ''
+    
+    # Branch recém-criada ou apagada não tem um intervalo para comparar
+    if not html_url or not before.strip('0') or not after.strip('0'):
+        return None
+    
+    return f"{html_url}/compare/{before[:12]}...{after[:12]}"
+
+def chunk_embeds(embeds):
+    """Divide os embeds em mensagens respeitando os limites do Discord"""
+    chunk, size = [], 0
+    for embed in embeds:
+        if chunk and (len(chunk) == MAX_EMBEDS_PER_MESSAGE
+                      or size + len(embed) > MAX_EMBED_CHARS_PER_MESSAGE):
+            yield chunk
+            chunk, size = [], 0
+        chunk.append(embed)
+        size += len(embed)
+    if chunk:
+        yield chunk
+
+def build_push_embed(data):
+    """Monta o embed do Discord para um push"""
+    repo = data.get('repository', {})
+    pusher = data.get('pusher', {})
+    commits = data.get('commits', [])
+    ref = data.get('ref', '')
+    branch = ref.split('/')[-1] if '/' in ref else ref
+    full_name = repo.get('full_name', 'Unknown')
+    html_url = repo.get('html_url', '')
+    
+    # Cria embed do Discord
+    embed = discord.Embed(
+        title=f"📦 Push em {full_name}",
+        description=f"**Branch:** `{branch}`\n**Commits:** {len(commits)}",
+        color=COLOR_PUSH,
+        timestamp=datetime.now(timezone.utc),
+        url=html_url
+    )
+    
+    # Informações do autor
+    author_name = pusher.get('name', 'Unknown')
+    embed.set_author(
+        name=author_name,
+        icon_url=pusher.get('avatar_url', '')
+    )
+    
+    # Informações do repositório
+    embed.add_field(
+        name="Repositório",
+        value=f"[{full_name}]({html_url})",
+        inline=True
+    )
+    
+    # Link para comparar alterações
+    if 'compare' in data:
+        embed.add_field(
+            name="Comparar",
+            value=f"[Ver alterações]({data['compare']})",
+            inline=True
+        )
+    
+    # Lista de commits num único campo (máximo 10)
+    lines = []
+    size = 0
+    for commit in commits[:MAX_COMMITS_LISTED]:
+        short_sha = commit.get('id', '')[:7]
+        commit_message = commit.get('message', '').split('\n')[0]
         
-        repo = data.get('repository', {})
-        pusher = data.get('pusher', {})
-        commits = data.get('commits', [])
-        ref = data.get('ref', '')
-        branch = ref.split('/')[-1] if '/' in ref else ref
+        # Limita tamanho da mensagem
+        if len(commit_message) > 80:
+            commit_message = commit_message[:77] + "..."
         
-        # Cria embed do Discord
-        embed = discord.Embed(
-            title=f"📦 Push em {repo.get('full_name', 'Unknown')}",
-            description=f"**Branch:** `{branch}`\n**Commits:** {len(commits)}",
-            color=discord.Color.green(),
-            timestamp=datetime.now(),
-            url=repo.get('html_url', '')
-        )
+        # Remove markdown problemático
+        commit_message = commit_message.translate(MARKDOWN_TRANSLATION)
         
-        # Informações do autor
-        author_name = pusher.get('name', 'Unknown')
-        embed.set_author(
-            name=author_name,
-            icon_url=pusher.get('avatar_url', '')
-        )
+        commit_author = commit.get('author', {}).get('name', 'Unknown')
         
-        # Informações do repositório
+        # O link fica no SHA: colchetes na mensagem não quebram o markdown
+        line = f"[`{short_sha}`]({commit.get('url', '')}) {commit_message} — {commit_author}"
+        size += len(line) + 1
+        if size > COMMITS_FIELD_BUDGET:
+            break
+        lines.append(line)
+    
+    # Se houver mais commits
+    if len(commits) > len(lines):
+        lines.append(f"+{len(commits) - len(lines)} commits adicionais")
+    
+    if commits:
         embed.add_field(
-            name="Repositório",
-            value=f"[{repo.get('full_name', 'Unknown')}]({repo.get('html_url', '')})",
-            inline=True
+            name=f"Commits ({len(commits)})",
+            value="\n".join(lines),
+            inline=False
         )
-        
-        # Link para comparar alterações
-        if 'compare' in data:
-            embed.add_field(
-                name="Comparar",
-                value=f"[Ver alterações]({data['compare']})",
-                inline=True
-            )
-        
-        # Lista de commits (máximo 3)
-        for i, commit in enumerate(commits[:3]):
-            short_sha = commit.get('id', '')[:7]
-            commit_message = commit.get('message', '').split('\n')[0]
-            
-            # Limita tamanho da mensagem
-            if len(commit_message) > 80:
-                commit_message = commit_message[:77] + "..."
-            
-            # Remove markdown problemático
-            commit_message = commit_message.replace('`', "'").replace('*', '')
-            
-            commit_author = commit.get('author', {}).get('name', 'Unknown')
+    
+    embed.set_footer(text=f"Push por {author_name}")
+    
+    return embed
+
+async def send_embeds(channel, embeds):
+    """Envia embeds ao canal respeitando o rate limit do Discord"""
+    async with send_semaphore:
+        for attempt in range(1, MAX_SEND_ATTEMPTS + 1):
+            async with channel_limiter:
+                try:
+                    return await channel.send(embeds=embeds)
+                except discord.HTTPException as e:
+                    if e.status != 429 or attempt == MAX_SEND_ATTEMPTS:
+                        raise
+                    retry_after = float(e.response.headers.get('Retry-After', 1))
             
-            embed.add_field(
-                name=f"Commit `{short_sha}` por {commit_author}",
-                value=f"{commit_message}\n[Ver commit]({commit.get('url', '')})",
-                inline=False
-            )
-        
-        # Se houver mais commits
-        if len(commits) > 3:
-            embed.add_field(
-                name="Mais commits",
-                value=f"+{len(commits) - 3} commits adicionais",
-                inline=False
-            )
+            # Segura o semáforo para que nenhum outro envio fure o limite
+            logger.warning("⏳ Rate limit do Discord, aguardando %ss", retry_after)
+            await asyncio.sleep(retry_after)
+
+async def process_github_push_batch(pushes, delivery_ids=()):
+    """Envia um lote de pushes para o Discord, um embed por push"""
+    try:
+        channel = get_target_channel()
+        if not channel:
+            logger.error("❌ Canal %s não encontrado (entregas: %s)", CHANNEL_ID, delivery_ids)
+            return
         
-        embed.set_footer(text=f"Push por {author_name}")
+        embeds = [build_push_embed(data) for data in pushes]
         
-        # Envia para o Discord
-        await channel.send(embed=embed)
-        logger.info(f"✅ Notificação enviada para #{channel.name}")
+        # Envia para o Discord, com vários embeds por mensagem
+        for chunk in chunk_embeds(embeds):
+            await send_embeds(channel, chunk)
+        logger.info(
+            "✅ %s notificação(ões) enviada(s) para #%s (entregas: %s)",
+            len(embeds), channel.name, delivery_ids
+        )
         
     except discord.errors.Forbidden:
-        logger.error(f"❌ Sem permissão para enviar mensagem no canal {CHANNEL_ID}")
+        logger.error(
+            "❌ Sem permissão para enviar mensagem no canal %s (entregas: %s)",
+            CHANNEL_ID, delivery_ids
+        )
     except Exception as e:
-        logger.error(f"❌ Erro ao processar push: {e}", exc_info=True)
+        logger.error("❌ Erro ao processar push %s: %s", delivery_ids, e, exc_info=True)
 
 # ===================== EVENTOS DO BOT =====================
 @bot.event
 async def on_ready():
     """Evento quando o bot conecta"""
-    logger.info(f"✅ Bot conectado como {bot.user.name}")
-    logger.info(f"📊 Servidores: {len(bot.guilds)}")
-    logger.info(f"📌 Canal alvo: {CHANNEL_ID}")
+    logger.info("✅ Bot conectado como %s", bot.user.name)
+    logger.info("📊 Servidores: %s", len(bot.guilds))
+    logger.info("📌 Canal alvo: %s", CHANNEL_ID)
     
-    # Inicia o processamento de pushes
-    bot.loop.create_task(process_pushes())
+    # Guarda o canal alvo para não buscá-lo a cada push
+    bot.target_channel = bot.get_channel(CHANNEL_ID)
+    if bot.target_channel is None:
+        logger.warning("⚠️ Canal alvo %s ainda não disponível; nova busca a cada push", CHANNEL_ID)
+    
+    # Inicia o processamento de pushes e o servidor de webhooks
+    global push_worker
+    if push_worker is None:
+        push_worker = bot.loop.create_task(process_pushes())
+    await start_webhook_server()
     
     # Muda o status do bot
     await bot.change_presence(
@@ -286,13 +472,20 @@ async def on_ready():
     
     # Log dos canais disponíveis
     for guild in bot.guilds:
-        logger.info(f"🏰 Servidor: {guild.name} (ID: {guild.id})")
+        logger.info("🏰 Servidor: %s (ID: %s)", guild.name, guild.id)
         for channel in guild.text_channels:
             if channel.id == CHANNEL_ID:
-                logger.info(f"   📍 Canal alvo encontrado: #{channel.name}")
+                logger.info("   📍 Canal alvo encontrado: #%s", channel.name)
     
     logger.info("🎉 Bot pronto e aguardando webhooks!")
 
+@bot.event
+async def on_guild_channel_delete(channel):
+    """Esquece o canal alvo se ele for apagado"""
+    if channel.id == CHANNEL_ID:
+        logger.warning("⚠️ Canal alvo #%s foi apagado", channel.name)
+        bot.target_channel = None
+
 # ===================== COMANDOS =====================
 @bot.command(name='teste')
 async def teste(ctx):
@@ -311,47 +504,48 @@ async def teste(ctx):
     
     await ctx.send(embed=embed)
 
+# Embed fixo, montado uma única vez
+SETUP_EMBED = discord.Embed(
+    title="🔧 Configuração do Webhook GitHub",
+    color=discord.Color.blue()
+)
+
+SETUP_EMBED.add_field(
+    name="1. Acesse seu repositório",
+    value="GitHub → Settings → Webhooks → Add webhook",
+    inline=False
+)
+
+SETUP_EMBED.add_field(
+    name="2. Payload URL",
+    value="`https://SEU_NGROK_URL/github-webhook`",
+    inline=False
+)
+
+SETUP_EMBED.add_field(
+    name="3. Content type",
+    value="`application/json`",
+    inline=True
+)
+
+SETUP_EMBED.add_field(
+    name="4. Secret",
+    value="Use a chave do seu arquivo `.env`",
+    inline=True
+)
+
+SETUP_EMBED.add_field(
+    name="5. Eventos",
+    value="Selecione: `Just the push event`",
+    inline=False
+)
+
+SETUP_EMBED.set_footer(text="Use !ngrok para obter a URL atual")
+
 @bot.command(name='setup')
 async def setup(ctx):
     """Instruções para configurar o webhook"""
-    embed = discord.Embed(
-        title="🔧 Configuração do Webhook GitHub",
-        color=discord.Color.blue()
-    )
-    
-    embed.add_field(
-        name="1. Acesse seu repositório",
-        value="GitHub → Settings → Webhooks → Add webhook",
-        inline=False
-    )
-    
-    embed.add_field(
-        name="2. Payload URL",
-        value="`https://SEU_NGROK_URL/github-webhook`",
-        inline=False
-    )
-    
-    embed.add_field(
-        name="3. Content type",
-        value="`application/json`",
-        inline=True
-    )
-    
-    embed.add_field(
-        name="4. Secret",
-        value="Use a chave do seu arquivo `.env`",
-        inline=True
-    )
-    
-    embed.add_field(
-        name="5. Eventos",
-        value="Selecione: `Just the push event`",
-        inline=False
-    )
-    
-    embed.set_footer(text="Use !ngrok para obter a URL atual")
-    
-    await ctx.send(embed=embed)
+    await ctx.send(embed=SETUP_EMBED)
 
 @bot.command(name='simulate')
 async def simulate(ctx):
@@ -381,7 +575,7 @@ async def simulate(ctx):
         'compare': f'https://github.com/{REPO_OWNER}/{REPO_NAME}/compare/old...new'
     }
     
-    push_queue.put({'event': 'push', 'data': test_data})
+    push_queue.put_nowait({'event': 'push', 'data': test_data})
     
     embed = discord.Embed(
         title="🧪 Push Simulado",
@@ -423,7 +617,7 @@ async def health_check(ctx):
     embed.add_field(name="Latência", value=f"{round(bot.latency * 1000)}ms", inline=True)
     
     # Verifica canal configurado
-    channel = bot.get_channel(CHANNEL_ID)
+    channel = get_target_channel()
     if channel:
         embed.add_field(name="Canal Alvo", value=f"🟢 #{channel.name}", inline=True)
     else:
@@ -432,37 +626,58 @@ async def health_check(ctx):
     # Verifica fila
     embed.add_field(name="Fila", value=f"{push_queue.qsize()} itens", inline=True)
     
-    # Verifica Flask (simples)
-    embed.add_field(name="Webhook Server", value="🟢 Ativo (porta 5000)", inline=True)
+    # Verifica servidor de webhooks
+    if webhook_active:
+        embed.add_field(name="Webhook Server", value="🟢 Ativo (porta 5000)", inline=True)
+    else:
+        embed.add_field(name="Webhook Server", value="🔴 Inativo", inline=True)
     
     await ctx.send(embed=embed)
 
+# Embed fixo, montado uma única vez
+CHANGELOG_EMBED = discord.Embed(
+    title="📋 Changelog do Bot",
+    description="Últimas atualizações e funcionalidades",
+    color=discord.Color.teal()
+)
+
+CHANGELOG_EMBED.add_field(
+    name="v1.0.0",
+    value="✅ Webhooks GitHub funcionando\n✅ Notificações em embed\n✅ Sistema de fila\n✅ Comandos administrativos\n✅ Logs detalhados",
+    inline=False
+)
+
+CHANGELOG_EMBED.add_field(
+    name="Comandos disponíveis",
+    value="!teste - Testa o bot\n!setup - Instruções\n!simulate - Push teste\n!queue - Estado da fila\n!health - Health check",
+    inline=False
+)
+
+CHANGELOG_EMBED.set_footer(text="Bot desenvolvido para monitorar GitHub")
+
 @bot.command(name='changelog')
 async def changelog(ctx):
     """Mostra as últimas atualizações do bot"""
-    embed = discord.Embed(
-        title="📋 Changelog do Bot",
-        description="Últimas atualizações e funcionalidades",
-        color=discord.Color.teal()
-    )
-    
-    embed.add_field(
-        name="v1.0.0",
-        value="✅ Webhooks GitHub funcionando\n✅ Notificações em embed\n✅ Sistema de fila\n✅ Comandos administrativos\n✅ Logs detalhados",
-        inline=False
-    )
-    
-    embed.add_field(
-        name="Comandos disponíveis",
-        value="!teste - Testa o bot\n!setup - Instruções\n!simulate - Push teste\n!queue - Estado da fila\n!health - Health check",
-        inline=False
-    )
-    
-    embed.set_footer(text="Bot desenvolvido para monitorar GitHub")
-    
-    await ctx.send(embed=embed)
+    await ctx.send(embed=CHANGELOG_EMBED)
 
 # ===================== INICIALIZAÇÃO =====================
+async def run_bot():
+    """Executa o bot e o servidor de webhooks no mesmo event loop"""
+    async with bot:
+        # Conexões persistentes para a sessão HTTP única do discord.py
+        # (o connector precisa do loop rodando, por isso não vai no commands.Bot)
+        bot.http.connector = aiohttp.TCPConnector(
+            limit=30,
+            limit_per_host=10,
+            ttl_dns_cache=300,
+            keepalive_timeout=75
+        )
+        
+        try:
+            await bot.start(DISCORD_TOKEN)
+        finally:
+            await stop_webhook_server()
+
 def main():
     """Função principal para inicializar tudo"""
     
@@ -479,23 +694,17 @@ def main():
     logger.info("🚀 INICIANDO GITHUB-DISCORD BOT")
     logger.info("=" * 50)
     
-    # Inicia Flask em thread separada
-    flask_thread = threading.Thread(target=run_flask, daemon=True)
-    flask_thread.start()
-    
-    logger.info("⏳ Aguardando Flask iniciar...")
-    import time
-    time.sleep(2)  # Aguarda Flask iniciar
-    
-    # Inicia o bot Discord
+    # Inicia o bot Discord (o servidor de webhooks sobe no on_ready)
     logger.info("🤖 Iniciando bot Discord...")
     
     try:
-        bot.run(DISCORD_TOKEN)
+        asyncio.run(run_bot())
+    except KeyboardInterrupt:
+        logger.info("👋 Bot encerrado")
     except discord.LoginFailure:
         logger.error("❌ Token do Discord inválido")
     except Exception as e:
-        logger.error(f"❌ Erro ao iniciar bot: {e}")
+        logger.error("❌ Erro ao iniciar bot: %s", e)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()